@@ -1,22 +1,94 @@
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, render_template, jsonify, request, g
+from flask.json.provider import JSONProvider
+from flask_compress import Compress
 import pandas as pd
 import datetime
-import json
+import functools
+import hashlib
+import orjson
 import os
-import requests
 import time
 import yfinance as yf
-from bs4 import BeautifulSoup
+from lxml import html as lxml_html
 import threading
 import re
+from collections import OrderedDict
+import string
 from zoneinfo import ZoneInfo
-from fetch_sp500 import load_sp500_data as load_local_data, calculate_sector_data, fetch_and_save, DATA_FILE, sanitize_data
+from fetch_sp500 import load_sp500_data as load_local_data, calculate_sector_data, fetch_and_save, dataset_version, load_sector_data, HTTP_SESSION
 
 GITHUB_DATA_URL = "https://raw.githubusercontent.com/yashsomani9414/stock/main/sp500_data.json"
 
-app = Flask(__name__)
+class OrjsonProvider(JSONProvider):
+    """Serve jsonify() responses with orjson instead of the stdlib encoder.
+    orjson writes NaN/Infinity as null, so payloads need no NaN scrubbing."""
+    OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=self.OPTIONS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj, option=self.OPTIONS), mimetype="application/json")
+
+class DatasetResponseCache:
+    """
+    Serialized and compressed API bodies for the current dataset version.
+    Keys look like "<kind>;<etag>|<path>"; the store empties itself when a key
+    for a new ETag arrives, keys without an ETag are never stored, and at most
+    `maxsize` bodies are kept (least recently used go first).
+    """
+    def __init__(self, maxsize=16):
+        self._etag = None
+        self._bodies = OrderedDict()
+        self._maxsize = maxsize
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _etag_of(key):
+        return key.partition(';')[2].partition('|')[0]
+
+    def get(self, key):
+        with self._lock:
+            body = self._bodies.get(key)
+            if body is not None:
+                self._bodies.move_to_end(key)
+            return body
+
+    def set(self, key, value):
+        etag = self._etag_of(key)
+        if not etag:
+            return
+        with self._lock:
+            if etag != self._etag:
+                self._etag = etag
+                self._bodies = OrderedDict()
+            self._bodies[key] = value
+            self._bodies.move_to_end(key)
+            while len(self._bodies) > self._maxsize:
+                self._bodies.popitem(last=False)
+
+response_cache = DatasetResponseCache()
 
-# Global state for background refresh
+app = Flask(__name__)
+app.json = OrjsonProvider(app)
+
+# Compress JSON payloads (repetitive keys) and pages per the client's Accept-Encoding
+app.config["COMPRESS_MIMETYPES"] = ["application/json", "text/html", "text/css", "application/javascript"]
+app.config["COMPRESS_LEVEL"] = 4
+app.config["COMPRESS_MIN_SIZE"] = 512
+# Reuse compressed dataset responses; the key carries the ETag set by dataset_response().
+# Keyed by path, not full_path: dataset routes ignore query args, so cache-busting
+# query strings must not each get their own copy
+app.config["COMPRESS_CACHE_BACKEND"] = lambda: response_cache
+app.config["COMPRESS_CACHE_KEY"] = lambda req: f"{g.get('data_etag', '')}|{req.path}"
+Compress(app)
+
+# Global state for background refresh. Writers swap in a new dict under
+# refresh_lock; status polls read the current reference without locking.
 refresh_status = {
     "is_running": False,
     "current": 0,
@@ -26,38 +98,118 @@ refresh_status = {
 }
 refresh_lock = threading.Lock()
 
+def update_refresh_status(**changes):
+    global refresh_status
+    with refresh_lock:
+        refresh_status = {**refresh_status, **changes}
+
+def start_background_refresh():
+    """Start fetch_and_update_data_wrapper() in a thread unless a refresh is
+    already running; returns False in that case."""
+    global refresh_status
+    with refresh_lock:
+        if refresh_status["is_running"]:
+            return False
+        refresh_status = {**refresh_status, "is_running": True, "status": "running",
+                          "message": "Refreshing S&P 500 data (PT schedule)..."}
+    thread = threading.Thread(target=fetch_and_update_data_wrapper)
+    thread.daemon = True
+    thread.start()
+    return True
+
+# How long a GitHub Raw copy of the dataset is trusted before re-checking
+GITHUB_CACHE_TTL = 600
+_github_cache = {"fetched_at": 0.0, "data": None}
+_github_cache_lock = threading.Lock()
+
+def fetch_github_data():
+    """GitHub Raw copy of the dataset, re-downloaded at most once per GITHUB_CACHE_TTL."""
+    with _github_cache_lock:
+        if time.time() - _github_cache["fetched_at"] < GITHUB_CACHE_TTL:
+            return _github_cache["data"]
+        github_data = None
+        try:
+            resp = HTTP_SESSION.get(GITHUB_DATA_URL, timeout=5)
+            if resp.status_code == 200:
+                github_data = orjson.loads(resp.content)
+        except Exception as e:
+            print(f"GitHub fallback failed: {e}")
+        # Failures are cached too so an outage doesn't add 5s to every request
+        _github_cache["fetched_at"] = time.time()
+        _github_cache["data"] = github_data
+        return github_data
+
 def load_sp500_data():
     """Load data with GitHub fallback if local is stale or missing."""
     local_data = load_local_data()
     
     # In Cloud Run, the local file is part of the container image and static.
     # We fetch the latest data from GitHub if the local version is older.
-    try:
-        resp = requests.get(GITHUB_DATA_URL, timeout=5)
-        if resp.status_code == 200:
-            github_data = resp.json()
-            if github_data and len(github_data) > 0:
-                gh_updated = github_data[0].get('LastUpdated')
-                loc_updated = local_data[0].get('LastUpdated') if local_data else None
-                
-                # Compare timestamps (Lexicographical works for YYYY-MM-DD HH:MM:SS)
-                if not loc_updated or (gh_updated and gh_updated > loc_updated):
-                    print("Updating local cache from GitHub Raw.")
-                    # We don't write to DATA_FILE in production (ephemeral)
-                    # but we return the fresh data.
-                    return github_data
-    except Exception as e:
-        print(f"GitHub fallback failed: {e}")
+    github_data = fetch_github_data()
+    if github_data and len(github_data) > 0:
+        gh_updated = github_data[0].get('LastUpdated')
+        loc_updated = local_data[0].get('LastUpdated') if local_data else None
+        
+        # Compare timestamps (Lexicographical works for YYYY-MM-DD HH:MM:SS)
+        if not loc_updated or (gh_updated and gh_updated > loc_updated):
+            # We don't write to DATA_FILE in production (ephemeral)
+            # but we return the fresh data.
+            return github_data
         
     return local_data
 
+# yf.Ticker memoizes info/news/financials per object, so objects are shared
+# only within a window of this many seconds
+TICKER_TTL = 900
+
+@functools.lru_cache(maxsize=256)
+def _ticker_for_window(symbol, window):
+    return yf.Ticker(symbol)
+
+def get_ticker(symbol):
+    """Shared yf.Ticker for symbol, replaced every TICKER_TTL seconds."""
+    return _ticker_for_window(symbol, int(time.time() // TICKER_TTL))
+
+def data_etag(data):
+    """Version tag for responses derived from the stock dataset."""
+    return dataset_version(data)
+
+def client_has_etag(etag):
+    """If-None-Match covers `etag`, including Flask-Compress's "<etag>:<encoding>" form."""
+    tags = request.if_none_match
+    return tags.star_tag or any(tag.partition(':')[0] == etag for tag in tags.as_set())
+
+def dataset_response(data, build):
+    """
+    JSON response for a view derived from `data`. Answers 304 if the client
+    already holds the current ETag; otherwise build()'s result (an object, or
+    bytes that are already JSON) is serialized once per dataset version and path.
+    """
+    etag = data_etag(data)
+    g.data_etag = etag
+    if client_has_etag(etag):
+        response = app.response_class(status=304)
+    else:
+        key = f"json;{etag}|{request.path}"
+        body = response_cache.get(key)
+        if body is None:
+            body = build()
+            if not isinstance(body, bytes):
+                body = orjson.dumps(body, option=OrjsonProvider.OPTIONS)
+            response_cache.set(key, body)
+        response = app.response_class(body, mimetype="application/json")
+    response.set_etag(etag)
+    # Always revalidate (a cheap 304 via the ETag) so the reload after a refresh
+    # never gets a browser-cached pre-refresh copy
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 def check_stale_and_refresh():
     """Trigger background refresh if data is older than 24h OR never refreshed.
     Safe for Cloud Run (non-blocking)."""
     if os.environ.get('K_SERVICE'):
         return
 
-    global refresh_status
     try:
         data = load_sp500_data()
         needs_refresh = False
@@ -76,13 +228,8 @@ def check_stale_and_refresh():
             else:
                 needs_refresh = True
         
-        if needs_refresh:
-            with refresh_lock:
-                if not refresh_status["is_running"]:
-                    thread = threading.Thread(target=fetch_and_update_data_wrapper)
-                    thread.daemon = True
-                    thread.start()
-                    print("On-visit refresh triggered.")
+        if needs_refresh and start_background_refresh():
+            print("On-visit refresh triggered.")
     except Exception as e:
         print(f"Error in on-visit check: {e}")
 
@@ -112,38 +259,62 @@ def market_news_page():
 def api_data():
     check_stale_and_refresh()
     data = load_sp500_data()
-    return jsonify(sanitize_data(data))
+    return dataset_response(data, lambda: data)
+
+def sector_payload(data):
+    """Aggregates precomputed at write time when they belong to `data`
+    (not so when GitHub had newer data), else computed now."""
+    sectors = load_sector_data(data)
+    if sectors is None:
+        sectors = calculate_sector_data(data)
+    return sectors
 
 @app.route('/api/sector_data')
 def api_sector_data():
     data = load_sp500_data()
-    sector_data = calculate_sector_data(data)
-    return jsonify(sanitize_data(sector_data))
+    return dataset_response(data, lambda: sector_payload(data))
+
+@functools.lru_cache(maxsize=512)
+def _history_body(symbol, day):
+    """
+    Chart payload for 1 year of daily closes and its ETag, serialized once per
+    symbol and Pacific-time `day` so same-day views skip the Yahoo request.
+    Raises LookupError when there is nothing to chart (errors are not cached).
+    """
+    # Fetch 1 year of daily data
+    hist = get_ticker(symbol).history(period="1y")
+    
+    if hist is None or hist.empty:
+        raise LookupError('No history found')
+        
+    # Format for Chart.js
+    # Check if 'Close' exists
+    if 'Close' not in hist.columns:
+        raise LookupError('Close price data missing')
+
+    prices = hist['Close'].tolist()
+    dates = hist.index.strftime('%Y-%m-%d').tolist()
+    
+    body = orjson.dumps({
+        'symbol': symbol,
+        'prices': [round(p, 2) for p in prices],
+        'dates': dates
+    }, option=OrjsonProvider.OPTIONS)
+    return body, hashlib.sha1(body).hexdigest()[:16]
 
 @app.route('/api/history/<symbol>')
 def api_history(symbol):
     """Return historical prices from Yahoo Finance for the chart."""
     try:
-        stock = yf.Ticker(symbol)
-        # Fetch 1 year of daily data
-        hist = stock.history(period="1y")
-        
-        if hist is None or hist.empty:
-            return jsonify({'error': 'No history found'}), 404
-            
-        # Format for Chart.js
-        # Check if 'Close' exists
-        if 'Close' not in hist.columns:
-            return jsonify({'error': 'Close price data missing'}), 404
-
-        prices = hist['Close'].tolist()
-        dates = hist.index.strftime('%Y-%m-%d').tolist()
-        
-        return jsonify({
-            'symbol': symbol,
-            'prices': [round(p, 2) for p in prices],
-            'dates': dates
-        })
+        body, etag = _history_body(symbol, datetime.datetime.now(ZoneInfo("America/Los_Angeles")).date())
+        if client_has_etag(etag):
+            response = app.response_class(status=304)
+        else:
+            response = app.response_class(body, mimetype="application/json")
+        response.set_etag(etag)
+        return response
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 404
     except Exception as e:
         print(f"Error fetching history for {symbol}: {e}")
         return jsonify({'error': str(e)}), 500
@@ -198,7 +369,7 @@ def parse_yf_news(news_list):
 def api_stock_news(symbol):
     """API endpoint for stock news, expected by some frontend components."""
     try:
-        ticker = yf.Ticker(symbol)
+        ticker = get_ticker(symbol)
         news = ticker.news
         if not news:
             return jsonify([])
@@ -217,37 +388,22 @@ def stock_news_page(symbol):
 def fetch_and_update_data_wrapper():
     """Wrapper to maintain background status reporting if needed, 
     or just call fetch_and_save directly."""
-    global refresh_status
     try:
-        with refresh_lock:
-            refresh_status["is_running"] = True
-            refresh_status["status"] = "running"
-            refresh_status["message"] = "Refreshing S&P 500 data (PT schedule)..."
-        
         count = fetch_and_save()
-        
-        with refresh_lock:
-            refresh_status["is_running"] = False
-            refresh_status["status"] = "success"
-            refresh_status["message"] = f"Successfully refreshed data."
+        update_refresh_status(is_running=False, status="success", message="Successfully refreshed data.")
     except Exception as e:
-        with refresh_lock:
-            refresh_status["is_running"] = False
-            refresh_status["status"] = "error"
-            refresh_status["message"] = f"Error: {str(e)}"
+        update_refresh_status(is_running=False, status="error", message=f"Error: {str(e)}")
 
 @app.route('/api/refresh')
 def api_refresh():
     """Trigger data refresh (Asynchronous)."""
-    global refresh_status
     force = request.args.get('force', 'false').lower() == 'true'
     
     # Check if this is a Cloud Scheduler trigger (optional security)
     is_scheduler = request.headers.get('X-Cloud-Scheduler') == 'true'
     
-    with refresh_lock:
-        if refresh_status["is_running"]:
-            return jsonify({"status": "error", "message": "Refresh already in progress."}), 400
+    if refresh_status["is_running"]:
+        return jsonify({"status": "error", "message": "Refresh already in progress."}), 400
 
     if not force and not is_scheduler:
         data = load_sp500_data()
@@ -270,9 +426,8 @@ def api_refresh():
         }), 400
 
     # Fallback for local execution
-    thread = threading.Thread(target=fetch_and_update_data_wrapper)
-    thread.daemon = True
-    thread.start()
+    if not start_background_refresh():
+        return jsonify({"status": "error", "message": "Refresh already in progress."}), 400
     return jsonify({"status": "success", "message": "Data refresh started in background."}), 202
 
 @app.route('/api/refresh_status')
@@ -289,21 +444,26 @@ def api_refresh_status():
         "is_scheduler": request.headers.get('X-Cloud-Scheduler') == 'true'
     })
 
+_UTF8_HTML_PARSER = lxml_html.HTMLParser(encoding='utf-8')
+
 def _get_clean_filing_lines(url):
     """Fetch a SEC filing, strip XBRL/metadata, return clean text lines."""
     headers = {
         "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36"
     }
-    response = requests.get(url, headers=headers, timeout=30)
+    response = HTTP_SESSION.get(url, headers=headers, timeout=30)
     if response.status_code != 200:
         return []
-    soup = BeautifulSoup(response.text, 'html.parser')
-    # Remove XBRL inline tags
-    for tag in soup.find_all(True):
-        if ':' in tag.name:
-            tag.decompose()
-    text = soup.get_text(separator='\n')
-    lines = text.split('\n')
+    # Re-encode the decoded text so lxml sees the same characters requests decoded
+    tree = lxml_html.document_fromstring(response.text.encode('utf-8'), parser=_UTF8_HTML_PARSER)
+    # Remove XBRL inline tags (with their content) plus scripts, styles and comments;
+    # the newline keeps each removed node's tail text on its own line
+    for el in tree.xpath('//*[contains(name(), ":")] | //script | //style | //comment()'):
+        if el.getparent() is None:
+            continue
+        el.tail = '\n' + (el.tail or '')
+        el.drop_tree()
+    lines = '\n'.join(tree.itertext()).split('\n')
     clean = []
     for line in lines:
         s = line.strip()
@@ -317,75 +477,209 @@ def _get_clean_filing_lines(url):
         clean.append(s)
     return clean
 
-def _find_section(lines, heading_patterns, stop_patterns, max_chars=12000):
-    """Find a filing section by its heading, validating real content follows."""
-    candidates = []
-    for i, line in enumerate(lines):
-        s = line.strip()
-        for pat in heading_patterns:
-            if re.match(pat, s, re.IGNORECASE):
+@functools.lru_cache(maxsize=32)
+def _pattern_union(patterns):
+    """One case-insensitive regex matching any of `patterns` (a tuple), compiled once."""
+    return re.compile('|'.join(f'(?:{p})' for p in patterns), re.IGNORECASE)
+
+def _find_sections(lines, specs):
+    """Find several filing sections by their headings in one pass over the lines,
+    validating real content follows each heading. `specs` maps a section name to
+    (heading_patterns, stop_patterns, max_chars); returns name -> section text."""
+    stripped = [line.strip() for line in lines]
+    heading_res = {name: _pattern_union(tuple(headings)) for name, (headings, _, _) in specs.items()}
+    # One match per line against every heading; only hits are attributed to a section
+    any_heading_re = _pattern_union(tuple(p for headings, _, _ in specs.values() for p in headings))
+    candidates = {name: [] for name in specs}
+    for i, s in enumerate(stripped):
+        if not any_heading_re.match(s):
+            continue
+        for name, heading_re in heading_res.items():
+            if heading_re.match(s):
                 # Verify substantial text follows (not a ToC entry)
-                text_after = ''
-                for j in range(1, min(20, len(lines) - i)):
-                    text_after += lines[i + j].strip() + ' '
-                if len(text_after) > 200:
-                    candidates.append((i + 1, len(text_after)))
+                following = stripped[i + 1:i + 20]
+                text_after = sum(map(len, following)) + len(following)
+                if text_after > 200:
+                    candidates[name].append((i + 1, text_after))
+
+    sections = {}
+    for name, (_, stop_patterns, max_chars) in specs.items():
+        if not candidates[name]:
+            sections[name] = ""
+            continue
+        stop_re = _pattern_union(tuple(stop_patterns))
+        # Pick the candidate with the most text after it
+        best_idx = max(candidates[name], key=lambda x: x[1])[0]
+        collected = []
+        total_chars = 0
+        for s in stripped[best_idx:]:
+            if len(s) < 100 and stop_re.match(s):
                 break
-    if not candidates:
-        return ""
-    # Pick the candidate with the most text after it
-    best_idx = max(candidates, key=lambda x: x[1])[0]
-    collected = []
-    total_chars = 0
-    for i in range(best_idx, len(lines)):
-        s = lines[i].strip()
-        for spat in stop_patterns:
-            if re.match(spat, s, re.IGNORECASE) and len(s) < 100:
-                return '\n'.join(collected)
-        collected.append(s)
-        total_chars += len(s)
-        if total_chars > max_chars:
-            break
-    return '\n'.join(collected)
+            collected.append(s)
+            total_chars += len(s)
+            if total_chars > max_chars:
+                break
+        sections[name] = '\n'.join(collected)
+    return sections
+
+_SENT_SPLIT = re.compile(r'(?<=[.!?])\s+')
+# Filing boilerplate; sentences containing any of these (lowercased) are skipped
+_BASE_SKIP_PHRASES = (
+    'check mark', 'check one', 'accelerated filer', 'emerging growth',
+    'exchange act', 'rule 12b', 'form 10-k', 'form 10-q', 'section 13',
+    'table of contents', 'page number', 'incorporated by reference',
+    'not applicable', 'see note', '☐', '☑', '☒', '¨'
+)
+
+_DROP_ASCII_LETTERS = str.maketrans('', '', string.ascii_letters)
+
+def _alpha_count(s):
+    """Number of alphabetic characters in s; ASCII text is counted in one C-level pass."""
+    if s.isascii():
+        return len(s) - len(s.translate(_DROP_ASCII_LETTERS))
+    return sum(c.isalpha() for c in s)
+
+def _iter_sentences(text):
+    """Lazily yield the pieces _SENT_SPLIT.split(text) would return, so callers
+    that stop early never split the rest of a long filing."""
+    start = 0
+    for m in _SENT_SPLIT.finditer(text):
+        yield text[start:m.start()]
+        start = m.end()
+    yield text[start:]
 
 def _extract_points(text, keywords, limit=5, exclude_phrases=None):
     """Extract meaningful sentences containing keywords, filtering boilerplate."""
     if not text:
         return []
-    sentences = re.split(r'(?<=[.!?])\s+', text)
+    sentences = _iter_sentences(text)
+    # Any keyword as a whole word, in a single search per sentence
+    keyword_re = _pattern_union(tuple(rf'\b{re.escape(kw)}\b' for kw in keywords))
+    skip_re = _pattern_union(tuple(map(re.escape, _BASE_SKIP_PHRASES + tuple(exclude_phrases or ()))))
     results = []
     seen = set()
-    skip_phrases = [
-        'check mark', 'check one', 'accelerated filer', 'emerging growth',
-        'exchange act', 'rule 12b', 'form 10-k', 'form 10-q', 'section 13',
-        'table of contents', 'page number', 'incorporated by reference',
-        'not applicable', 'see note', '☐', '☑', '☒', '¨'
-    ]
-    if exclude_phrases:
-        skip_phrases.extend(exclude_phrases)
     for sent in sentences:
         sent = sent.strip()
         if len(sent) < 50 or len(sent) > 500:
             continue
-        lower = sent.lower()
-        if any(bp in lower for bp in skip_phrases):
+        # Cheapest rejections first: table rows, then sentences with no keyword;
+        # only survivors pay for lowercasing and the boilerplate scan
+        if _alpha_count(sent) * 2 < len(sent):
+            continue
+        if not keyword_re.search(sent):
             continue
-        # Skip lines that are mostly numbers/tables
-        alpha_ratio = sum(c.isalpha() for c in sent) / max(len(sent), 1)
-        if alpha_ratio < 0.5:
+        lower = sent.lower()
+        if skip_re.search(lower):
             continue
-        if any(re.search(r'\b' + kw + r'\b', sent, re.IGNORECASE) for kw in keywords):
-            if lower not in seen:
-                seen.add(lower)
-                results.append(sent)
+        if lower not in seen:
+            seen.add(lower)
+            results.append(sent)
         if len(results) >= limit:
             break
     return results
 
+@functools.lru_cache(maxsize=128)
+def _insights_for_url(url):
+    """Section-aware insights for one filing document; a filing URL's content never
+    changes, so results are cached by URL. Callers get the shared dict and must copy
+    it before modifying."""
+    lines = _get_clean_filing_lines(url)
+    if not lines:
+        # Raised rather than returned so a failed download isn't cached
+        raise LookupError(f"No text retrieved from {url}")
+
+    # --- Extract key sections ---
+    sections = _find_sections(lines, {
+        # Business (Item 1)
+        "business": (
+            [r'^BUSINESS\s*OVERVIEW', r'^OUR\s*BUSINESS', r'^GENERAL\s*$',
+             r'^BUSINESS\s*$', r'^BUSINESS\s+DESCRIPTION'],
+            [r'^RISK\s+FACTORS', r'^PROPERTIES', r'^LEGAL\s+PROCEEDINGS',
+             r'^UNRESOLVED', r'^CYBERSECURITY'],
+            12000
+        ),
+        # Risk Factors (Item 1A)
+        "risk": (
+            [r'^RISK\s+FACTORS\.?$', r'^STRATEGIC\s+RISKS'],
+            [r'^UNRESOLVED\s+STAFF', r'^PROPERTIES', r'^CYBERSECURITY',
+             r'^LEGAL\s+PROCEEDINGS', r'^MINE\s+SAFETY',
+             r"^MANAGEMENT.S\s+DISCUSSION"],
+            15000
+        ),
+        # MD&A (Item 7) — try multiple heading patterns
+        "mda": (
+            [r'^CONSOLIDATED\s+RESULTS', r'^OVERVIEW\s*$',
+             r'^RESULTS\s+OF\s+OPERATIONS', r'^SEGMENT\s+OPERATIONS',
+             r'^EXECUTIVE\s+SUMMARY'],
+            [r'^QUANTITATIVE', r'^FINANCIAL\s+STATEMENTS',
+             r'^CHANGES\s+IN', r'^CONTROLS', r'^CRITICAL\s+ACCOUNTING'],
+            15000
+        ),
+    })
+    business_text, risk_text, mda_text = sections["business"], sections["risk"], sections["mda"]
+
+    combined = business_text + '\n' + mda_text
+    # Full text for tariff search (tariff mentions can appear anywhere)
+    full_text = '\n'.join(lines)
+
+    # Negative-sentiment phrases to exclude from opportunities
+    neg_exclude = [
+        'adversely', 'negatively impact', 'negatively affect',
+        'decline', 'could affect', 'may affect',
+        'uncertain', 'threat', 'challenged', 'headwind',
+        'disruption', 'decrease our revenue', 'increase our costs',
+        'could also adversely', 'nonexistent', 'compliance costs',
+        'material adverse', 'regulations or changes', 'subject to risk',
+        'penalties', 'litigation', 'loss of', 'damage to',
+        'bad actors', 'social engineering', 'cybersecurity',
+        'data breach', 'ransomware', 'vulnerability'
+    ]
+
+    # --- Extract insights from the correct sections ---
+    insights = {
+        "opportunities": _extract_points(
+            combined,
+            ['growth', 'opportunity', 'expansion', 'innovation',
+             'strategic', 'new product', 'new market', 'demand',
+             'ramp', 'increase', 'momentum', 'invest', 'capacity',
+             'backlog', 'order book', 'delivered', 'revenue grew',
+             'profit grew', 'margin improvement'],
+            limit=5,
+            exclude_phrases=neg_exclude
+        ),
+        "risks": _extract_points(
+            risk_text,
+            ['could adversely', 'may adversely', 'uncertainty',
+             'challenge', 'decline', 'volatility', 'material adverse',
+             'disruption', 'failure', 'negatively impact'],
+            limit=5
+        ),
+        "tariff_impact": _extract_points(
+            full_text,
+            ['tariff', 'trade policy', 'import duty',
+             'trade restriction', 'trade war', 'customs duty'],
+            limit=5
+        ),
+        "customers": _extract_points(
+            combined,
+            ['customer', 'client', 'contract', 'backlog',
+             'order', 'airline', 'defense', 'government'],
+            limit=5
+        ),
+        "one_time": _extract_points(
+            combined + '\n' + risk_text,
+            ['one-time', 'non-recurring', 'impairment',
+             'restructuring', 'settlement', 'divestiture',
+             'write-off', 'gain on sale', 'separation'],
+            limit=5
+        )
+    }
+    return insights
+
 def extract_comprehensive_insights(symbol):
     """Scrape and parse the latest SEC filing (10-K or 10-Q) using section-aware extraction."""
     try:
-        ticker = yf.Ticker(symbol)
+        ticker = get_ticker(symbol)
         filings = ticker.sec_filings
         if not filings:
             return None
@@ -403,99 +697,10 @@ def extract_comprehensive_insights(symbol):
         if not url:
             return None
 
-        lines = _get_clean_filing_lines(url)
-        if not lines:
+        try:
+            return dict(_insights_for_url(url))
+        except LookupError:
             return None
-
-        # --- Extract key sections ---
-        # Business (Item 1)
-        business_text = _find_section(
-            lines,
-            [r'^BUSINESS\s*OVERVIEW', r'^OUR\s*BUSINESS', r'^GENERAL\s*$',
-             r'^BUSINESS\s*$', r'^BUSINESS\s+DESCRIPTION'],
-            [r'^RISK\s+FACTORS', r'^PROPERTIES', r'^LEGAL\s+PROCEEDINGS',
-             r'^UNRESOLVED', r'^CYBERSECURITY'],
-            max_chars=12000
-        )
-
-        # Risk Factors (Item 1A)
-        risk_text = _find_section(
-            lines,
-            [r'^RISK\s+FACTORS\.?$', r'^STRATEGIC\s+RISKS'],
-            [r'^UNRESOLVED\s+STAFF', r'^PROPERTIES', r'^CYBERSECURITY',
-             r'^LEGAL\s+PROCEEDINGS', r'^MINE\s+SAFETY',
-             r"^MANAGEMENT.S\s+DISCUSSION"],
-            max_chars=15000
-        )
-
-        # MD&A (Item 7) — try multiple heading patterns
-        mda_text = _find_section(
-            lines,
-            [r'^CONSOLIDATED\s+RESULTS', r'^OVERVIEW\s*$',
-             r'^RESULTS\s+OF\s+OPERATIONS', r'^SEGMENT\s+OPERATIONS',
-             r'^EXECUTIVE\s+SUMMARY'],
-            [r'^QUANTITATIVE', r'^FINANCIAL\s+STATEMENTS',
-             r'^CHANGES\s+IN', r'^CONTROLS', r'^CRITICAL\s+ACCOUNTING'],
-            max_chars=15000
-        )
-
-        combined = business_text + '\n' + mda_text
-        # Full text for tariff search (tariff mentions can appear anywhere)
-        full_text = '\n'.join(lines)
-
-        # Negative-sentiment phrases to exclude from opportunities
-        neg_exclude = [
-            'adversely', 'negatively impact', 'negatively affect',
-            'decline', 'could affect', 'may affect',
-            'uncertain', 'threat', 'challenged', 'headwind',
-            'disruption', 'decrease our revenue', 'increase our costs',
-            'could also adversely', 'nonexistent', 'compliance costs',
-            'material adverse', 'regulations or changes', 'subject to risk',
-            'penalties', 'litigation', 'loss of', 'damage to',
-            'bad actors', 'social engineering', 'cybersecurity',
-            'data breach', 'ransomware', 'vulnerability'
-        ]
-
-        # --- Extract insights from the correct sections ---
-        insights = {
-            "opportunities": _extract_points(
-                combined,
-                ['growth', 'opportunity', 'expansion', 'innovation',
-                 'strategic', 'new product', 'new market', 'demand',
-                 'ramp', 'increase', 'momentum', 'invest', 'capacity',
-                 'backlog', 'order book', 'delivered', 'revenue grew',
-                 'profit grew', 'margin improvement'],
-                limit=5,
-                exclude_phrases=neg_exclude
-            ),
-            "risks": _extract_points(
-                risk_text,
-                ['could adversely', 'may adversely', 'uncertainty',
-                 'challenge', 'decline', 'volatility', 'material adverse',
-                 'disruption', 'failure', 'negatively impact'],
-                limit=5
-            ),
-            "tariff_impact": _extract_points(
-                full_text,
-                ['tariff', 'trade policy', 'import duty',
-                 'trade restriction', 'trade war', 'customs duty'],
-                limit=5
-            ),
-            "customers": _extract_points(
-                combined,
-                ['customer', 'client', 'contract', 'backlog',
-                 'order', 'airline', 'defense', 'government'],
-                limit=5
-            ),
-            "one_time": _extract_points(
-                combined + '\n' + risk_text,
-                ['one-time', 'non-recurring', 'impairment',
-                 'restructuring', 'settlement', 'divestiture',
-                 'write-off', 'gain on sale', 'separation'],
-                limit=5
-            )
-        }
-        return insights
     except Exception as e:
         print(f"Error extracting SEC insights for {symbol}: {e}")
         return None
@@ -505,7 +710,7 @@ def get_stock_details(symbol):
     """Fetch comprehensive details for a specific stock."""
     symbol = symbol.upper()
     try:
-        ticker = yf.Ticker(symbol)
+        ticker = get_ticker(symbol)
         
         # 1. Financials
         info = ticker.info
@@ -570,12 +775,12 @@ def get_stock_details(symbol):
         fin_summary = []
         if financials is not None and not financials.empty:
             try:
-                dates = financials.columns[:4] # Last 4 years
-                for d in dates:
-                    # Check if requested indices exist in financials
-                    rev = financials.loc['Total Revenue', d] if 'Total Revenue' in financials.index and d in financials.columns else 0
-                    ni = financials.loc['Net Income', d] if 'Net Income' in financials.index and d in financials.columns else 0
-                    
+                recent = financials.iloc[:, :4] # Last 4 years
+                # Each row pulled out once; a missing row charts as zeros
+                missing = [0] * len(recent.columns)
+                rev_row = recent.loc['Total Revenue'].tolist() if 'Total Revenue' in recent.index else missing
+                ni_row = recent.loc['Net Income'].tolist() if 'Net Income' in recent.index else missing
+                for d, rev, ni in zip(recent.columns, rev_row, ni_row):
                     fin_summary.append({
                         "date": d.strftime('%Y') if hasattr(d, 'strftime') else str(d),
                         "revenue": float(rev) if pd.notnull(rev) else 0,
@@ -611,7 +816,7 @@ def get_global_news():
     """Fetch global market news."""
     try:
         # Use SPY news as a proxy for global market news (^GSPC often returns empty)
-        mkt = yf.Ticker("SPY")
+        mkt = get_ticker("SPY")
         news_raw = mkt.news
         if not news_raw:
             return jsonify([])
@@ -626,7 +831,10 @@ def api_earnings_calendar():
     data = load_sp500_data()
     if not data:
         return jsonify([])
-    
+    return dataset_response(data, lambda: _sorted_earnings(data))
+
+def _sorted_earnings(data):
+    """Stocks that have an EarningsDate, soonest first."""
     # Filter for stocks with earnings date and sort them
     earnings_stocks = []
     for s in data:
@@ -644,8 +852,9 @@ def api_earnings_calendar():
         return str(d)
 
     earnings_stocks.sort(key=get_date_val)
-    
-    return jsonify(sanitize_data(earnings_stocks))
+    return earnings_stocks
 
 if __name__ == '__main__':
-    app.run(debug=True, use_reloader=False, port=5000)
+    # Local development only; production runs under gunicorn (see Dockerfile/Procfile).
+    # The debugger is opt-in via FLASK_DEBUG=1.
+    app.run(debug=os.environ.get('FLASK_DEBUG') == '1', use_reloader=False, threaded=True, port=5000)
@@ -1,38 +1,111 @@
 import pandas as pd
+import numpy as np
 import datetime
-import json
+import hashlib
+import orjson
 import os
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import time
+import random
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 import yfinance as yf
-from bs4 import BeautifulSoup
+from yfinance.data import YfData
+from lxml import html as lxml_html
 from zoneinfo import ZoneInfo
 
 DATA_FILE = 'sp500_data.json'
-
-def sanitize_data(obj):
-    """Recursively replace NaN values with None for JSON serializability."""
-    if isinstance(obj, dict):
-        return {k: sanitize_data(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [sanitize_data(x) for x in obj]
-    elif isinstance(obj, float):
-        if pd.isna(obj):
-            return None
-    return obj
+# Sector aggregates of DATA_FILE, precomputed whenever it is written and tagged
+# with the dataset_version() they were computed from
+SECTOR_FILE = 'sp500_sector_data.json'
+
+# Index constituents per Wikipedia URL with the validators they were served with,
+# so unchanged lists are revalidated with a conditional GET instead of re-parsed
+TICKERS_FILE = 'sp500_tickers.json'
+
+# In-process cache of the parsed DATA_FILE, invalidated when the file is replaced or modified
+_data_cache = {"stamp": None, "data": None}
+_data_cache_lock = threading.Lock()
+
+def _build_http_session():
+    """Keep-alive session with pooled connections and retries on transient errors."""
+    session = requests.Session()
+    retry = Retry(total=3, backoff_factor=0.3, status_forcelist=(429, 500, 502, 503, 504), allowed_methods=("GET",))
+    adapter = HTTPAdapter(pool_connections=10, pool_maxsize=16, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+# Shared by every plain-HTTP fetch (Wikipedia, GitHub, SEC); yfinance manages its own session
+HTTP_SESSION = _build_http_session()
+
+def frame_to_records(df):
+    """DataFrame rows as dicts for JSON, with NaN/Inf mapped to None in one vectorized pass."""
+    df = df.replace([np.inf, -np.inf], np.nan).astype(object)
+    return df.where(df.notna(), None).to_dict(orient='records')
 
 def load_sp500_data():
-    """Load S&P 500 stock data from JSON file."""
-    if os.path.exists(DATA_FILE):
+    """Load S&P 500 stock data from JSON file.
+    The parsed list is memoized by file identity (path, inode, mtime, size),
+    so callers must not mutate it."""
+    try:
+        st = os.stat(DATA_FILE)
+    except OSError:
+        return []
+    stamp = (DATA_FILE, st.st_ino, st.st_mtime_ns, st.st_size)
+    with _data_cache_lock:
+        if _data_cache["stamp"] == stamp:
+            return _data_cache["data"]
         try:
-            with open(DATA_FILE, 'r') as f:
-                data = json.load(f)
-            return data
+            with open(DATA_FILE, 'rb') as f:
+                data = orjson.loads(f.read())
         except Exception as e:
             print(f"Error loading {DATA_FILE}: {e}")
             return []
-    return []
+        _data_cache["stamp"] = stamp
+        _data_cache["data"] = data
+        return data
     
+# Data files are written compact; set PRETTY_JSON=1 to indent them for reading
+JSON_WRITE_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | (orjson.OPT_INDENT_2 if os.environ.get('PRETTY_JSON') == '1' else 0)
+
+def _write_json_atomic(path, obj):
+    """Serialize obj to a temp file and swap it in, so readers never see a partial file."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(orjson.dumps(obj, option=JSON_WRITE_OPTIONS))
+    os.replace(tmp_path, path)
+
+def dataset_version(data):
+    """Version tag of a stock dataset, from its LastUpdated stamp and record count."""
+    last_updated = data[0].get('LastUpdated', '') if data else ''
+    return hashlib.sha1(f"{last_updated}|{len(data)}".encode()).hexdigest()[:16]
+
+def save_sp500_data(output):
+    """Write stock records to DATA_FILE and their sector aggregates to SECTOR_FILE."""
+    _write_json_atomic(DATA_FILE, output)
+    _write_json_atomic(SECTOR_FILE, {"DataVersion": dataset_version(output),
+                                     "Sectors": calculate_sector_data(output)})
+
+def load_sector_data(data):
+    """
+    Sector aggregates saved in SECTOR_FILE for `data`, or None when the file is
+    missing or was written for another dataset version. File timestamps aren't
+    trusted for this: checkouts, image builds and scripts that rewrite only
+    DATA_FILE don't keep the two files' mtimes in order.
+    """
+    try:
+        with open(SECTOR_FILE, 'rb') as f:
+            saved = orjson.loads(f.read())
+    except (OSError, orjson.JSONDecodeError):
+        return None
+    if not isinstance(saved, dict) or saved.get("DataVersion") != dataset_version(data):
+        return None
+    return saved.get("Sectors")
+
 def get_market_regime():
     """Determine if market is BULLISH or BEARISH based on SPY vs 200D MA."""
     try:
@@ -51,50 +124,93 @@ def get_market_regime():
         print(f"Error fetching regime: {e}")
         return "BULLISH"
 
+SECTOR_AVG_COLUMNS = {
+    "ma50": "50D MA",
+    "ma200": "200D MA",
+    "trend": "Trend Strength",
+    "ret_1d": "1D Return",
+    "ret_5d": "5D Return",
+    "ret_1m": "1M Return",
+    "ret_6m": "6M Return",
+}
+
+# Decision Breakdown key -> Trade Decision value it counts
+SECTOR_BREAKDOWN_LABELS = {
+    "Strong Buy": "Strong Buy",
+    "Buy (Small)": "Buy (Small)",
+    "Hold": "Hold",
+    "Reduce": "Reduce",
+    "Sell": "Sell",
+    "Rejected": "Rejected – Universal Filter",
+}
+
+def _round_or_none(value, keep_zero=True):
+    """Round an aggregate to 2dp, mapping None (and optionally 0) to None."""
+    if value is None or (not keep_zero and not value):
+        return None
+    return round(float(value), 2)
+
+def _as_number(value):
+    """Numeric value of a record field, or None for missing/NaN/non-numeric."""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if value != value else value
+
+def _new_sector_acc():
+    return {
+        "mcap": 0.0, "pe_num": 0.0, "pe_den": 0.0, "count": 0,
+        "sums": dict.fromkeys(SECTOR_AVG_COLUMNS, 0.0),
+        "counts": dict.fromkeys(SECTOR_AVG_COLUMNS, 0),
+        "breakdown": dict.fromkeys(SECTOR_BREAKDOWN_LABELS, 0),
+    }
+
 def calculate_sector_data(data):
     """Aggregate data by sector."""
     if not data:
         return []
     
-    df = pd.DataFrame(data)
-    if df.empty or 'Sector' not in df.columns:
-        return []
-
-    sectors = []
-    for sector_name, group in df.groupby("Sector"):
-        if sector_name == "N/A":
+    decision_keys = {label: key for key, label in SECTOR_BREAKDOWN_LABELS.items()}
+    acc = defaultdict(_new_sector_acc)
+    for row in data:
+        sector = row.get('Sector')
+        if sector is None or sector != sector or sector == "N/A":
             continue
+        a = acc[sector]
+        a["count"] += 1
+        
+        # Weighted P/E only counts rows that have both P/E and Market Cap
+        mcap = _as_number(row.get('Market Cap'))
+        pe = _as_number(row.get('P/E Ratio'))
+        if mcap is not None:
+            a["mcap"] += mcap
+            if pe is not None:
+                a["pe_num"] += pe * mcap
+                a["pe_den"] += mcap
+        
+        for name, col in SECTOR_AVG_COLUMNS.items():
+            value = _as_number(row.get(col))
+            if value is not None:
+                a["sums"][name] += value
+                a["counts"][name] += 1
+        
+        key = decision_keys.get(row.get('Trade Decision'))
+        if key:
+            a["breakdown"][key] += 1
 
-        total_mcap = sum([x for x in group['Market Cap'] if x is not None])
-
-        # Weighted P/E
-        pe_group = group.dropna(subset=['P/E Ratio', 'Market Cap'])
-        if not pe_group.empty and total_mcap > 0:
-            weighted_pe = (pe_group['P/E Ratio'] * pe_group['Market Cap']).sum() / pe_group['Market Cap'].sum()
+    sectors = []
+    for sector_name in sorted(acc):
+        a = acc[sector_name]
+        total_mcap = a["mcap"]
+        if a["pe_den"] > 0 and total_mcap > 0:
+            weighted_pe = a["pe_num"] / a["pe_den"]
         else:
             weighted_pe = None
-
-        avg_50d = group['50D MA'].mean()
-        avg_200d = group['200D MA'].mean()
-        # Ensure Trend Strength is numeric before averaging
-        trend_series = pd.to_numeric(group['Trend Strength'], errors='coerce')
-        avg_trend = trend_series.mean()
-        
-        avg_ret_1d = group.get('1D Return', pd.Series([None])).mean()
-        avg_ret_5d = group.get('5D Return', pd.Series([None])).mean()
-        avg_ret_1m = group.get('1M Return', pd.Series([None])).mean()
-        avg_ret_6m = group.get('6M Return', pd.Series([None])).mean()
+        averages = {name: a["sums"][name] / n if n else None for name, n in a["counts"].items()}
 
         # Decision Breakdown
-        decisions = group['Trade Decision'].value_counts().to_dict()
-        breakdown = {
-            "Strong Buy": decisions.get("Strong Buy", 0),
-            "Buy (Small)": decisions.get("Buy (Small)", 0),
-            "Hold": decisions.get("Hold", 0),
-            "Reduce": decisions.get("Reduce", 0),
-            "Sell": decisions.get("Sell", 0),
-            "Rejected": decisions.get("Rejected – Universal Filter", 0)
-        }
+        breakdown = a["breakdown"]
 
         # --- Aggregate Sector Decision Logic ---
         total_valid = sum([v for k, v in breakdown.items() if k != "Rejected"])
@@ -115,21 +231,28 @@ def calculate_sector_data(data):
 
         sectors.append({
             "Sector": sector_name,
-            "Market Cap": total_mcap,
-            "Weighted P/E": round(weighted_pe, 2) if weighted_pe and not pd.isna(weighted_pe) else None,
-            "Avg 50D MA": round(avg_50d, 2) if avg_50d and not pd.isna(avg_50d) else None,
-            "Avg 200D MA": round(avg_200d, 2) if avg_200d and not pd.isna(avg_200d) else None,
-            "Avg Trend Strength": round(avg_trend, 2) if avg_trend is not None and not pd.isna(avg_trend) else None,
-            "Avg 1D Return": round(avg_ret_1d, 2) if avg_ret_1d is not None and not pd.isna(avg_ret_1d) else None,
-            "Avg 5D Return": round(avg_ret_5d, 2) if avg_ret_5d is not None and not pd.isna(avg_ret_5d) else None,
-            "Avg 1M Return": round(avg_ret_1m, 2) if avg_ret_1m is not None and not pd.isna(avg_ret_1m) else None,
-            "Avg 6M Return": round(avg_ret_6m, 2) if avg_ret_6m is not None and not pd.isna(avg_ret_6m) else None,
-            "Stock Count": len(group),
+            "Market Cap": int(total_mcap) if float(total_mcap).is_integer() else float(total_mcap),
+            "Weighted P/E": _round_or_none(weighted_pe, keep_zero=False),
+            "Avg 50D MA": _round_or_none(averages['ma50'], keep_zero=False),
+            "Avg 200D MA": _round_or_none(averages['ma200'], keep_zero=False),
+            "Avg Trend Strength": _round_or_none(averages['trend']),
+            "Avg 1D Return": _round_or_none(averages['ret_1d']),
+            "Avg 5D Return": _round_or_none(averages['ret_5d']),
+            "Avg 1M Return": _round_or_none(averages['ret_1m']),
+            "Avg 6M Return": _round_or_none(averages['ret_6m']),
+            "Stock Count": a["count"],
             "Decision Breakdown": breakdown,
             "Sector Decision": sector_decision
         })
     return sectors
 
+def _load_tickers_cache():
+    try:
+        with open(TICKERS_FILE, 'rb') as f:
+            return orjson.loads(f.read())
+    except (OSError, orjson.JSONDecodeError):
+        return {}
+
 def get_all_potential_tickers():
     """Scrape S&P 500, 400, and 600 tickers from Wikipedia."""
     indices = [
@@ -138,26 +261,54 @@ def get_all_potential_tickers():
     ]
     
     all_tickers = set()
-    headers = {"User-Agent": "Mozilla/5.0"}
+    cache = _load_tickers_cache()
+    # Only a fresh, non-empty list replaces a cached one; otherwise the file is left alone
+    cache_updated = False
     
     for index in indices:
+        cached = cache.get(index['url'])
+        headers = {"User-Agent": "Mozilla/5.0"}
+        if cached:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
         try:
             print(f"Fetching tickers for {index['name']}...")
-            response = requests.get(index['url'], headers=headers, timeout=10)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'html.parser')
-            table = soup.find('table', {'id': index['id']})
-            if not table:
+            response = HTTP_SESSION.get(index['url'], headers=headers, timeout=10)
+            if response.status_code == 304 and cached:
+                print(f"  {index['name']} list unchanged, using cached tickers")
+                all_tickers.update(cached["tickers"])
                 continue
-            
-            for row in table.find_all('tr')[1:]:
-                cells = row.find_all('td')
-                if len(cells) > 0:
-                    ticker = cells[0].text.strip().replace('.', '-')
-                    all_tickers.add(ticker)
+            response.raise_for_status()
+            tree = lxml_html.fromstring(response.content)
+            # First data cell of every row in the constituents table (header rows only have <th>)
+            tickers = [cell.text_content().strip().replace('.', '-')
+                       for cell in tree.xpath(f'//table[@id="{index["id"]}"]//tr/td[1]')]
+            if tickers:
+                all_tickers.update(tickers)
+                cache[index['url']] = {
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                    "tickers": tickers,
+                }
+                cache_updated = True
+            else:
+                print(f"  No tickers found for {index['name']}")
+                if cached:
+                    all_tickers.update(cached["tickers"])
             time.sleep(1) # Be nice to Wikipedia
         except Exception as e:
             print(f"Error fetching {index['name']} tickers: {e}")
+            if cached:
+                # A stale constituent list beats dropping the whole index for a day
+                all_tickers.update(cached["tickers"])
+    
+    if cache_updated:
+        try:
+            _write_json_atomic(TICKERS_FILE, cache)
+        except OSError as e:
+            print(f"Could not save ticker cache: {e}")
             
     return list(all_tickers)
 
@@ -180,50 +331,218 @@ def extract_earnings_date(ticker_obj, info):
     return None
 
 def calculate_rsi(series, period=14):
-    """Calculate Relative Strength Index (RSI)."""
+    """Calculate Relative Strength Index (RSI) over the last `period` closes."""
     if len(series) < period + 1:
         return None
-    delta = series.diff()
-    gain = (delta.where(delta > 0, 0)).rolling(window=period).mean()
-    loss = (-delta.where(delta < 0, 0)).rolling(window=period).mean()
-    rs = gain / loss
-    return 100 - (100 / (1 + rs)).iloc[-1]
-
-def get_batch_stock_info(symbols, delay=5.0):
-    """Fetch fundamental data for a batch of tickers."""
-    batch_results = []
-    tickers_obj = yf.Tickers(" ".join(symbols))
-    for symbol in symbols:
+    delta = np.diff(np.asarray(series, dtype=np.float64)[-(period + 1):])
+    gain = np.where(delta > 0, delta, 0).mean()
+    loss = np.where(delta < 0, -delta, 0).mean()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rs = gain / loss
+        return 100 - (100 / (1 + rs))
+
+def _right_align(values):
+    """Shift each row's NaNs to the front so the row ends with its valid samples, in order."""
+    valid = ~np.isnan(values)
+    order = np.argsort(valid, axis=1, kind='stable')
+    return np.take_along_axis(values, order, axis=1), valid.sum(axis=1)
+
+def compute_batch_metrics(close, volume):
+    """
+    Technical indicators for a batch of tickers at once. `close` and `volume`
+    are (tickers, days) arrays that may contain NaN gaps; each row is treated
+    as that ticker's dropna()'d series. Returns one dict per row, or None
+    where the ticker has fewer than 200 closes (or no volume).
+    """
+    c, n_close = _right_align(np.asarray(close, dtype=np.float64))
+    v, n_volume = _right_align(np.asarray(volume, dtype=np.float64))
+    if c.shape[1] < 200:
+        return [None] * len(c)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ma50, ma200 = c[:, -50:].mean(axis=1), c[:, -200:].mean(axis=1)
+        curr_price = c[:, -1]
+        dist_ma50 = np.where(ma50 > 0, ((curr_price / ma50) - 1) * 100, 0)
+
+        # RSI over the last 14 changes, as in calculate_rsi()
+        delta = np.diff(c[:, -15:], axis=1)
+        gain = np.where(delta > 0, delta, 0).mean(axis=1)
+        loss = np.where(delta < 0, -delta, 0).mean(axis=1)
+        rsi = 100 - (100 / (1 + gain / loss))
+
+        ret1d = (curr_price / c[:, -2] - 1) * 100
+        ret5d = (curr_price / c[:, -6] - 1) * 100
+        ret1m = (curr_price / c[:, -21] - 1) * 100
+        ret6m = (curr_price / c[:, -126] - 1) * 100
+        window = c[:, -126:]
+        vol6m = np.std(window[:, 1:] / window[:, :-1] - 1, axis=1, ddof=1) * (252**0.5) * 100
+
+        # Rows with under 20 volumes average what they have, like the old v[-20:] slice
+        avg_v20 = np.nansum(v[:, -20:], axis=1) / np.minimum(n_volume, 20)
+        curr_v = v[:, -1]
+        avg_v5 = np.nansum(v[:, -5:], axis=1) / np.minimum(n_volume, 5)
+        vol_chg1d = np.where(avg_v20 > 0, (curr_v / avg_v20 - 1) * 100, 0)
+        vol_chg5d = np.where(avg_v20 > 0, (avg_v5 / avg_v20 - 1) * 100, 0)
+
+    columns = zip(
+        np.round(ma50, 2).tolist(), np.round(ma200, 2).tolist(), np.round(rsi, 2).tolist(),
+        np.round(dist_ma50, 2).tolist(), np.round(ret1d, 2).tolist(), np.round(ret5d, 2).tolist(),
+        np.round(ret1m, 2).tolist(), np.round(ret6m, 2).tolist(), np.round(vol6m, 2).tolist(),
+        curr_v.tolist(), np.round(vol_chg1d, 2).tolist(), np.round(vol_chg5d, 2).tolist(),
+    )
+    results = []
+    for ok, (m50, m200, r, dist, r1d, r5d, r1m, r6m, vol, cv, vc1d, vc5d) in zip((n_close >= 200) & (n_volume > 0), columns):
+        if not ok:
+            results.append(None)
+            continue
+        results.append({
+            "50D MA": m50,
+            "200D MA": m200,
+            "RSI": r,
+            "DistFromMA50": dist,
+            "1D Return": r1d, "5D Return": r5d,
+            "1M Return": r1m, "6M Return": r6m,
+            "6M Volatility": vol if vol else None,
+            "Volume": int(cv), "Vol Change 1D": vc1d,
+            "Vol Change 5D": vc5d
+        })
+    return results
+
+def batch_price_matrices(data, batch):
+    """(symbols, close, volume) from a yf.download frame, as (tickers, days) arrays."""
+    if isinstance(data.columns, pd.MultiIndex):
+        close, volume = data['Close'], data['Volume']
+        symbols = [s for s in batch if s in close.columns and s in volume.columns]
+        close, volume = close[symbols], volume[symbols]
+    else:
+        symbols = batch[:1]
+        close, volume = data[['Close']], data[['Volume']]
+    return symbols, np.ascontiguousarray(close.to_numpy(dtype=np.float64).T), np.ascontiguousarray(volume.to_numpy(dtype=np.float64).T)
+
+# Concurrent .info requests; kept small since .info is what Yahoo rate-limits
+INFO_WORKERS = 8
+# Overall .info budget across those workers
+INFO_CALLS_PER_MINUTE = 100
+
+class RateLimiter:
+    """Spaces calls from any number of threads at least 60/per_minute seconds apart."""
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+info_rate_limiter = RateLimiter(INFO_CALLS_PER_MINUTE)
+
+def get_stock_info(ticker_obj, symbol, today):
+    """Fetch fundamental data for one ticker; `today` stamps InfoUpdated."""
+    try:
+        info_rate_limiter.wait()
+        info = ticker_obj.info
+        
+        # Calculate FCF Margin = Free Cash Flow / Total Revenue
+        fcf = info.get("freeCashflow")
+        revenue = info.get("totalRevenue")
+        fcf_margin = (fcf / revenue) if fcf and revenue and revenue > 0 else None
+        
+        return {
+            "Ticker": symbol,
+            "Name": info.get("shortName", "N/A"),
+            "Sector": info.get("sector", "N/A"),
+            "Industry": info.get("industry", "N/A"),
+            "Market Cap": info.get("marketCap"),
+            "P/E Ratio": info.get("trailingPE"),
+            "Price": info.get("currentPrice") or info.get("regularMarketPrice"),
+            "EarningsDate": extract_earnings_date(ticker_obj, info),
+            # V8: Quality Factor inputs
+            "ROE": info.get("returnOnEquity"),        # e.g. 0.35 = 35%
+            "Gross Margin": info.get("grossMargins"),  # e.g. 0.45 = 45%
+            "FCF Margin": fcf_margin,                  # calculated
+            "Debt/Equity": info.get("debtToEquity"),   # e.g. 150 = 1.5x (in %)
+            "InfoUpdated": today.isoformat(),
+        }
+    except Exception as e:
+        print(f"Error info {symbol}: {e}")
+        return {"Ticker": symbol, "Name": "N/A", "Sector": "N/A", "Industry": "N/A"}
+
+# Fundamentals from a previous run are reused for this many days
+INFO_MAX_AGE_DAYS = 7
+CACHED_INFO_FIELDS = ["Name", "Sector", "Industry", "EarningsDate", "ROE", "Gross Margin", "FCF Margin", "Debt/Equity", "InfoUpdated"]
+
+def cached_stock_info(cached, price, today, quote=None):
+    """
+    Rebuild a get_stock_info() row from the previous run's record, or None if
+    it has to be refetched (too old, incomplete, or earnings already reported).
+    Market Cap, P/E and the earnings date come from `quote` (a v7 quote
+    result) when available; otherwise Market Cap and P/E are rescaled to
+    today's close.
+    """
+    if not cached or not price or not cached.get("InfoUpdated"):
+        return None
+    try:
+        age = (today - datetime.date.fromisoformat(cached["InfoUpdated"])).days
+    except ValueError:
+        return None
+    old_price = cached.get("Price")
+    if age > INFO_MAX_AGE_DAYS or not old_price or not cached.get("Market Cap") or cached.get("Sector") in (None, "N/A"):
+        return None
+    edate = cached.get("EarningsDate")
+    if edate and str(edate) < today.isoformat():
+        return None
+    
+    scale = price / old_price
+    pe = cached.get("P/E Ratio")
+    row = {
+        **{k: cached.get(k) for k in CACHED_INFO_FIELDS},
+        "Market Cap": cached["Market Cap"] * scale,
+        "P/E Ratio": pe * scale if pe is not None else None,
+        "Price": price,
+    }
+    if quote:
+        row["Market Cap"] = quote.get("marketCap") or row["Market Cap"]
+        row["P/E Ratio"] = quote.get("trailingPE")
+        row["EarningsDate"] = extract_earnings_date(None, quote) or row["EarningsDate"]
+    return row
+
+QUOTE_URL = "https://query1.finance.yahoo.com/v7/finance/quote"
+# Symbols per v7 quote request
+QUOTE_BATCH_SIZE = 50
+
+def get_bulk_quotes(symbols):
+    """
+    Yahoo v7 quote results keyed by symbol, QUOTE_BATCH_SIZE symbols per
+    request. Goes through yfinance's shared session so its cookie/crumb is
+    reused. Batches that fail are left out.
+    """
+    quotes = {}
+    session = YfData()
+    for i in range(0, len(symbols), QUOTE_BATCH_SIZE):
+        params = {"symbols": ",".join(symbols[i:i+QUOTE_BATCH_SIZE]), "formatted": "false"}
         try:
-            info = tickers_obj.tickers[symbol].info
-            
-            # Calculate FCF Margin = Free Cash Flow / Total Revenue
-            fcf = info.get("freeCashflow")
-            revenue = info.get("totalRevenue")
-            fcf_margin = (fcf / revenue) if fcf and revenue and revenue > 0 else None
-            
-            batch_results.append({
-                "Ticker": symbol,
-                "Name": info.get("shortName", "N/A"),
-                "Sector": info.get("sector", "N/A"),
-                "Industry": info.get("industry", "N/A"),
-                "Market Cap": info.get("marketCap"),
-                "P/E Ratio": info.get("trailingPE"),
-                "Price": info.get("currentPrice") or info.get("regularMarketPrice"),
-                "EarningsDate": extract_earnings_date(tickers_obj.tickers[symbol], info),
-                # V8: Quality Factor inputs
-                "ROE": info.get("returnOnEquity"),        # e.g. 0.35 = 35%
-                "Gross Margin": info.get("grossMargins"),  # e.g. 0.45 = 45%
-                "FCF Margin": fcf_margin,                  # calculated
-                "Debt/Equity": info.get("debtToEquity"),   # e.g. 150 = 1.5x (in %)
-            })
+            result = session.get_raw_json(QUOTE_URL, params=params)
+            for quote in result.get("quoteResponse", {}).get("result") or []:
+                quotes[quote.get("symbol")] = quote
         except Exception as e:
-            print(f"Error info {symbol}: {e}")
-            batch_results.append({"Ticker": symbol, "Name": "N/A", "Sector": "N/A", "Industry": "N/A"})
-    time.sleep(delay)
-    return batch_results
+            print(f"Bulk quote error for batch {i}: {e}")
+    return quotes
 
-def calculate_score(row, sector_pe_medians, sector_vol_medians, history=None, market_regime="BULLISH"):
+def get_batch_stock_info(symbols, today):
+    """Fetch fundamental data for many tickers, INFO_WORKERS requests at a time
+    within the shared INFO_CALLS_PER_MINUTE budget."""
+    if not symbols:
+        return []
+    tickers_obj = yf.Tickers(" ".join(symbols))
+    with ThreadPoolExecutor(max_workers=INFO_WORKERS) as pool:
+        return list(pool.map(lambda s: get_stock_info(tickers_obj.tickers[s], s, today), symbols))
+
+def calculate_score(row, sector_pe_medians, sector_vol_medians, history=None, market_regime="BULLISH", today=None):
     """
     Weighted-Average Scoring Engine (V8)
     =====================================
@@ -231,6 +550,9 @@ def calculate_score(row, sector_pe_medians, sector_vol_medians, history=None, ma
     No single factor can dominate beyond its allocated weight.
     
     Weights: Trend 25% | Momentum 20% | Valuation 20% | Quality 15% | Volume 10% | Safety 10%
+    
+    `today` is the Pacific-time date used for the earnings blackout; pass it
+    when scoring many rows so it isn't recomputed per row.
     """
     try:
         prev_score = history.get('Score') if history else None
@@ -480,8 +802,8 @@ def calculate_score(row, sector_pe_medians, sector_vol_medians, history=None, ma
         edate_dist = 999
         if edate_str:
             try:
-                pt_today = datetime.datetime.now(ZoneInfo("America/Los_Angeles")).date()
-                edate_dist = (datetime.datetime.strptime(edate_str, '%Y-%m-%d').date() - pt_today).days
+                pt_today = today or datetime.datetime.now(ZoneInfo("America/Los_Angeles")).date()
+                edate_dist = (datetime.date.fromisoformat(edate_str) - pt_today).days
                 if -1 <= edate_dist <= 7:
                     return final_points, "Hold", new_low, highest_price, trailing_stop, rec_weight
             except: pass
@@ -517,6 +839,28 @@ def calculate_score(row, sector_pe_medians, sector_vol_medians, history=None, ma
         print(f"Error scoring: {e}")
         return 0, "ERROR", 0, 0, 0, 1.5
 
+# Tickers per yf.download call; yfinance fetches the batch concurrently (threads=True)
+# and returns (field, ticker) columns, so each field is one date x ticker frame
+HISTORY_BATCH_SIZE = 100
+# Retry delay doubles per attempt up to the cap, scaled by a random 0.5-1.5x so
+# retries after a rate limit don't all land on Yahoo at the same moment
+HISTORY_RETRY_BASE_DELAY = 10
+HISTORY_RETRY_MAX_DELAY = 60
+
+def download_history_batch(batch, label=0, attempts=3):
+    """Download 1y of daily bars for a batch of tickers in a single yf.download call."""
+    for attempt in range(attempts):
+        try:
+            data = yf.download(batch, period="1y", group_by='column', threads=True, progress=False)
+            if not data.empty:
+                return data
+        except Exception as e:
+            print(f"Download error for batch {label} (attempt {attempt+1}): {e}")
+        if attempt + 1 < attempts:
+            delay = min(HISTORY_RETRY_MAX_DELAY, HISTORY_RETRY_BASE_DELAY * 2 ** attempt)
+            time.sleep(delay * random.uniform(0.5, 1.5))
+    return None
+
 def fetch_and_save():
     print("Starting fetch...")
     regime = get_market_regime()
@@ -525,62 +869,33 @@ def fetch_and_save():
     print(f"Total potential tickers: {len(tickers)}")
     
     ma_rows = []
-    batch_size = 10
-    for i in range(0, len(tickers), batch_size):
-        batch = tickers[i:i+batch_size]
-        success = False
-        for attempt in range(3):
-            try:
-                data = yf.download(batch, period="1y", group_by='ticker', progress=False)
-                if not data.empty:
-                    success = True
-                    break
-            except Exception as e:
-                print(f"Download error for batch {i} (attempt {attempt+1}): {e}")
-                time.sleep(20)
+    last_close = {}
+    for i in range(0, len(tickers), HISTORY_BATCH_SIZE):
+        batch = tickers[i:i+HISTORY_BATCH_SIZE]
+        data = download_history_batch(batch, label=i)
         
-        if success:
-            for symbol in batch:
-                try:
-                    hist = data[symbol] if len(batch) > 1 else data
-                    close, volume = hist['Close'].dropna(), hist['Volume'].dropna()
-                    if len(close) < 200: continue
-                    
-                    ma50, ma200 = close.tail(50).mean(), close.tail(200).mean()
-                    rsi = calculate_rsi(close)
-                    curr_price = close.iloc[-1]
-                    dist_ma50 = ((curr_price / ma50) - 1) * 100 if ma50 > 0 else 0
-                    
-                    ret1d = (close.iloc[-1]/close.iloc[-2]-1)*100 if len(close)>=2 else 0
-                    ret5d = (close.iloc[-1]/close.iloc[-6]-1)*100 if len(close)>=6 else 0
-                    ret1m = (close.iloc[-1]/close.iloc[-21]-1)*100 if len(close)>=21 else 0
-                    ret6m = (close.iloc[-1]/close.iloc[-126]-1)*100 if len(close)>=126 else 0
-                    vol6m = close.tail(126).pct_change().std()*(252**0.5)*100 if len(close)>=126 else None
-                    
-                    avg_v20 = float(volume.tail(20).mean())
-                    curr_v = float(volume.iloc[-1])
-                    avg_v5 = float(volume.tail(5).mean())
-                    
-                    ma_rows.append({
-                        "Symbol": symbol, 
-                        "50D MA": round(ma50, 2), 
-                        "200D MA": round(ma200, 2),
-                        "RSI": round(rsi, 2) if rsi is not None else None,
-                        "DistFromMA50": round(dist_ma50, 2),
-                        "1D Return": round(ret1d, 2), "5D Return": round(ret5d, 2),
-                        "1M Return": round(ret1m, 2), "6M Return": round(ret6m, 2),
-                        "6M Volatility": round(vol6m, 2) if vol6m else None,
-                        "Volume": int(curr_v), "Vol Change 1D": round((curr_v/avg_v20-1)*100, 2) if avg_v20>0 else 0,
-                        "Vol Change 5D": round((avg_v5/avg_v20-1)*100, 2) if avg_v20>0 else 0
-                    })
-                except: continue
+        if data is not None:
+            symbols, close, volume = batch_price_matrices(data, batch)
+            latest = _right_align(close)[0][:, -1].tolist()
+            for symbol, metrics, last in zip(symbols, compute_batch_metrics(close, volume), latest):
+                if metrics is None: continue
+                ma_rows.append({"Symbol": symbol, **metrics})
+                last_close[symbol] = last
         time.sleep(5)
 
+    hist_map = {s['Symbol']: s for s in load_sp500_data() if 'Symbol' in s}
+    
     ma_df = pd.DataFrame(ma_rows)
     info_rows = []
-    symbols = ma_df["Symbol"].tolist()
-    for i in range(0, len(symbols), 50):
-        info_rows.extend(get_batch_stock_info(symbols[i:i+50]))
+    to_fetch = []
+    today = datetime.datetime.now(ZoneInfo("America/Los_Angeles")).date()
+    quotes = get_bulk_quotes([s for s in ma_df["Symbol"] if s in hist_map])
+    for symbol in ma_df["Symbol"]:
+        row = cached_stock_info(hist_map.get(symbol), last_close.get(symbol), today, quotes.get(symbol))
+        if row: info_rows.append({"Ticker": symbol, **row})
+        else: to_fetch.append(symbol)
+    print(f"Reusing cached fundamentals for {len(info_rows)} tickers, fetching {len(to_fetch)}.")
+    info_rows.extend(get_batch_stock_info(to_fetch, today))
     
     # Filter by Market Cap > $5B
     final_df = ma_df.merge(pd.DataFrame(info_rows), left_on="Symbol", right_on="Ticker", how="left").drop(columns=["Ticker"])
@@ -592,18 +907,17 @@ def fetch_and_save():
     count_after = len(final_df)
     print(f"Filtered from {count_before} to {count_after} stocks with Market Cap > $5B.")
     
-    final_df['Trend Strength'] = final_df.apply(lambda r: round((r['50D MA']/r['200D MA']-1)*100, 2) if r['200D MA'] else 0, axis=1)
-    
-    existing = []
-    if os.path.exists(DATA_FILE):
-        with open(DATA_FILE, 'r') as f: existing = json.load(f)
-    hist_map = {s['Symbol']: s for s in existing if 'Symbol' in s}
+    # Undefined (None in the output) when the 200D MA is missing or zero
+    ma200 = final_df['200D MA']
+    final_df['Trend Strength'] = ((final_df['50D MA'] / ma200 - 1) * 100).round(2).where(ma200.fillna(0) != 0)
     
     pe_med = final_df.groupby('Sector')['P/E Ratio'].median().to_dict()
     vol_med = final_df.groupby('Sector')['6M Volatility'].median().to_dict()
     
     # Calculate scores and decisions for each stock (V4)
-    results = final_df.apply(lambda r: calculate_score(r, pe_med, vol_med, hist_map.get(r['Symbol']), regime), axis=1)
+    # Score plain dicts; apply(axis=1) built a Series per row and every row.get went through its index
+    results = [calculate_score(r, pe_med, vol_med, hist_map.get(r['Symbol']), regime, today)
+               for r in final_df.to_dict(orient='records')]
     
     final_df['Score'] = [r[0] for r in results]
     final_df['Trade Decision'] = [r[1] for r in results]
@@ -617,21 +931,8 @@ def fetch_and_save():
     pacific_time = datetime.datetime.now(ZoneInfo("America/Los_Angeles"))
     final_df['LastUpdated'] = pacific_time.strftime("%Y-%m-%d %H:%M:%S")
     
-    output = final_df.where(pd.notnull(final_df), None).to_dict(orient='records')
-    
-    # Deep sanitize: replace any surviving NaN/Inf with None (fixes browser JSON.parse errors)
-    import math
-    def deep_sanitize(obj):
-        if isinstance(obj, dict):
-            return {k: deep_sanitize(v) for k, v in obj.items()}
-        elif isinstance(obj, list):
-            return [deep_sanitize(x) for x in obj]
-        elif isinstance(obj, float) and (math.isnan(obj) or math.isinf(obj)):
-            return None
-        return obj
-    
-    output = deep_sanitize(output)
-    with open(DATA_FILE, 'w') as f: json.dump(output, f, indent=2, allow_nan=False)
+    output = frame_to_records(final_df)
+    save_sp500_data(output)
     print(f"Done. Saved {len(output)} stocks.")
 
 if __name__ == "__main__":
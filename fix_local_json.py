@@ -1,6 +1,6 @@
-import json
 import datetime
 import pandas as pd
+from fetch_sp500 import DATA_FILE, load_sp500_data, save_sp500_data, frame_to_records
 
 def calculate_score_v3_1(row, sector_pe_medians, sector_vol_medians):
     try:
@@ -124,10 +124,8 @@ def calculate_score_v3_1(row, sector_pe_medians, sector_vol_medians):
         return 0, "ERROR"
 
 def main():
-    path = "sp500_data.json"
-    print(f"Loading {path}...")
-    with open(path, "r") as f:
-        data = json.load(f)
+    print(f"Loading {DATA_FILE}...")
+    data = load_sp500_data()
     
     df = pd.DataFrame(data)
     
@@ -137,17 +135,17 @@ def main():
     sector_vol_medians = df.groupby('Sector')['6M Volatility'].median().to_dict()
     
     print("Applying new v3.1 scoring logic locally...")
-    results = df.apply(lambda r: calculate_score_v3_1(r, sector_pe_medians, sector_vol_medians), axis=1)
+    # Score plain dicts rather than df.apply(axis=1), which builds a Series per row
+    results = [calculate_score_v3_1(r, sector_pe_medians, sector_vol_medians) for r in df.to_dict('records')]
     
     df['Score'] = [r[0] for r in results]
     df['Trade Decision'] = [r[1] for r in results]
     df['LastUpdated'] = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S") + " (Local Refix)"
     
-    output = df.to_dict(orient="records")
+    output = frame_to_records(df)
     
-    print(f"Saving updated data back to {path}...")
-    with open(path, "w") as f:
-        json.dump(output, f, indent=2)
+    print(f"Saving updated data back to {DATA_FILE}...")
+    save_sp500_data(output)
     print("Done! Local fix applied.")
 
 if __name__ == "__main__":
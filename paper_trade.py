@@ -17,6 +17,7 @@ import datetime
 import yfinance as yf
 import pandas as pd
 from zoneinfo import ZoneInfo
+from fetch_sp500 import load_sp500_data
 
 PORTFOLIO_FILE = 'paper_portfolio.json'
 DATA_FILE = 'sp500_data.json'
@@ -73,8 +74,7 @@ def auto_update():
         print(f"ERROR: {DATA_FILE} not found.")
         return
         
-    with open(DATA_FILE, 'r') as f:
-        data = json.load(f)
+    data = load_sp500_data()
     signal_map = {d['Symbol']: d for d in data}
     
     now_pt = datetime.datetime.now(ZoneInfo("America/Los_Angeles"))
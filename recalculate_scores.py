@@ -1,17 +1,15 @@
-import json
 import pandas as pd
 import os
 import datetime
 from zoneinfo import ZoneInfo
-from fetch_sp500 import calculate_score, DATA_FILE, get_market_regime
+from fetch_sp500 import calculate_score, DATA_FILE, get_market_regime, load_sp500_data, save_sp500_data, frame_to_records
 
 def recalculate():
     if not os.path.exists(DATA_FILE):
         print("Data file not found.")
         return
 
-    with open(DATA_FILE, 'r') as f:
-        data = json.load(f)
+    data = load_sp500_data()
 
     if not data:
         print("No data in file.")
@@ -41,41 +39,25 @@ def recalculate():
         row_dict['MarketRegime'] = regime
         new_results.append(row_dict)
 
-    # Convert back to clean JSON (NaN -> None) with double-sanitize
+    # Convert back to clean JSON (NaN/Inf -> None)
     output_df = pd.DataFrame(new_results)
     
     # Update LastUpdated timestamp in PT
     pacific_time = datetime.datetime.now(ZoneInfo("America/Los_Angeles"))
     output_df['LastUpdated'] = pacific_time.strftime("%Y-%m-%d %H:%M:%S")
 
-    output = output_df.where(pd.notnull(output_df), None).to_dict(orient='records')
+    output = frame_to_records(output_df)
     
-    # Deep sanitize: walk every value and replace any surviving NaN/Inf with None
-    import math
-    def deep_sanitize(obj):
-        if isinstance(obj, dict):
-            return {k: deep_sanitize(v) for k, v in obj.items()}
-        elif isinstance(obj, list):
-            return [deep_sanitize(x) for x in obj]
-        elif isinstance(obj, float) and (math.isnan(obj) or math.isinf(obj)):
-            return None
-        return obj
-    
-    output = deep_sanitize(output)
-    
-    with open(DATA_FILE, 'w') as f:
-        json.dump(output, f, indent=2, allow_nan=False)
+    save_sp500_data(output)
     
     print(f"Recalculation complete. Updated {len(output)} records.")
     
-    # Verify UPS specifically
-    ups = next((s for s in output if s['Symbol'] == 'UPS'), None)
-    if ups:
-        print(f"UPS Update: Score={ups['Score']}, Decision={ups['Trade Decision']}")
-    
-    rost = next((s for s in output if s['Symbol'] == 'ROST'), None)
-    if rost:
-        print(f"ROST Update: Score={rost['Score']}, Decision={rost['Trade Decision']}")
+    # Verify UPS and ROST specifically
+    by_symbol = {s['Symbol']: s for s in output}
+    for symbol in ('UPS', 'ROST'):
+        stock = by_symbol.get(symbol)
+        if stock:
+            print(f"{symbol} Update: Score={stock['Score']}, Decision={stock['Trade Decision']}")
 
 if __name__ == "__main__":
     recalculate()
@@ -1,63 +1,138 @@
 import app
+import os
+import sys
 import time
+import numpy as np
+import orjson
+from concurrent.futures import ThreadPoolExecutor
+from fetch_sp500 import (get_all_potential_tickers, download_history_batch,
+                         batch_price_matrices, compute_batch_metrics, load_sp500_data)
+
+# Tickers downloaded together to exercise the batched history path
+SAMPLE_SIZE = 50
+# Optional latency budget (ms) that every timed phase must meet
+PERF_BUDGET_MS = os.environ.get('STOCK_PERF_BUDGET_MS')
+
+def _ms_since(t0):
+    return (time.perf_counter_ns() - t0) / 1e6
+
+def _timed_get(client, url, **kwargs):
+    t0 = time.perf_counter_ns()
+    res = client.get(url, **kwargs)
+    return res, _ms_since(t0)
 
 def test_backend():
+    # One client for every API call the test makes
+    client = app.app.test_client()
+    timings = {}
+    # Non-fatal check failures are collected and raised at the end; fatal ones raise at once
+    failures = []
+
+    def fail(message):
+        print(f"FAIL: {message}")
+        failures.append(message)
+
     print("Testing S&P 500 ticker fetch...")
-    tickers = app.get_sp500_tickers()
+    t0 = time.perf_counter_ns()
+    tickers = get_all_potential_tickers()
+    timings['tickers'] = _ms_since(t0)
     if not tickers:
-        print("FAIL: Could not fetch tickers.")
-        return
+        raise AssertionError("Could not fetch tickers.")
     print(f"SUCCESS: Fetched {len(tickers)} tickers.")
-    # Check if Name exists
-    if 'Name' not in tickers[0]:
-        print("FAIL: 'Name' field missing in tickers.")
-        return
-    else:
-         print(f"SUCCESS: Found Company Name: {tickers[0]['Name']}")
-    
-    print(f"SUCCESS: Fetched {len(tickers)} tickers.")
-    
-    print("\nTesting single stock data fetch (AAPL)...")
-    ticker_obj = next((t for t in tickers if t['Symbol'] == 'AAPL'), None)
-    if not ticker_obj:
-        print("FAIL: AAPL not found in ticker list.")
-        return
-
-    data = app.get_stock_data(ticker_obj)
+
+    print(f"\nTesting batched stock data fetch (AAPL + {SAMPLE_SIZE - 1} others)...")
+    if 'AAPL' not in tickers:
+        raise AssertionError("AAPL not found in ticker list.")
+    sample = ['AAPL'] + [t for t in tickers if t != 'AAPL'][:SAMPLE_SIZE - 1]
+
+    # The chart request doesn't depend on the batch, so the two Yahoo round-trips overlap
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        history_future = pool.submit(_timed_get, client, '/api/history/AAPL')
+        # One yf.download call; yfinance fetches the batch's symbols concurrently
+        t0 = time.perf_counter_ns()
+        frame = download_history_batch(sample)
+        timings['history_batch'] = _ms_since(t0)
+    res, timings['history_api'] = history_future.result()
+    if frame is None:
+        raise AssertionError("History download returned no data.")
+    symbols, close, volume = batch_price_matrices(frame, sample)
+    metrics = dict(zip(symbols, compute_batch_metrics(close, volume)))
+    fetched = sum(m is not None for m in metrics.values())
+    print(f"SUCCESS: Metrics for {fetched}/{len(sample)} tickers in {timings['history_batch']:.1f} ms.")
+    missing = [s for s in sample if s not in metrics]
+    if missing:
+        print(f"  No data for: {', '.join(missing)}")
+
+    data = metrics.get('AAPL')
     if not data:
-        print("FAIL: Could not fetch AAPL data.")
-        return
-        
+        raise AssertionError("Could not fetch AAPL data.")
+
     print("\nTesting History API for AAPL...")
-    with app.test_client() as client:
-        res = client.get('/api/history/AAPL')
-        if res.status_code == 200:
-            hist_data = res.get_json()
-            if 'dates' in hist_data and len(hist_data['dates']) > 0:
-                print(f"SUCCESS: Fetched {len(hist_data['dates'])} days of history for AAPL.")
-            else:
-                print("FAIL: History data empty.")
+    if res.status_code == 200:
+        hist_data = orjson.loads(res.get_data())
+        if 'dates' in hist_data and len(hist_data['dates']) > 0:
+            print(f"SUCCESS: Fetched {len(hist_data['dates'])} days of history for AAPL.")
         else:
-             print(f"FAIL: History API returned {res.status_code}")
-    
+            fail("History data empty.")
+    else:
+        fail(f"History API returned {res.status_code}")
+
+    etag = res.headers.get('ETag')
+    if not etag:
+        fail("History API sent no ETag.")
+    else:
+        # Same-day revalidation should be a 304 from the cached body, not a Yahoo fetch
+        res, timings['history_revalidate'] = _timed_get(client, '/api/history/AAPL', headers={'If-None-Match': etag})
+        if res.status_code == 304:
+            print(f"SUCCESS: History API revalidated with 304 in {timings['history_revalidate']:.1f} ms.")
+        else:
+            fail(f"History API revalidation returned {res.status_code}, expected 304")
+
     print("SUCCESS: Fetched AAPL data:")
     for key, value in data.items():
         print(f"  {key}: {value}")
-        
+
     print("\nVerifying Trend Strength and Returns...")
-    ma50 = data['50D MA']
-    ma200 = data['200D MA']
-    trend = data['Trend Strength']
-    
     print(f"  5D Return: {data.get('5D Return')}%")
     print(f"  1M Return: {data.get('1M Return')}%")
     print(f"  6M Return: {data.get('6M Return')}%")
-    
-    expected_trend = round(((ma50 / ma200) - 1) * 100, 2)
-    if abs(trend - expected_trend) < 0.1:
-        print(f"SUCCESS: Trend Strength matches logic: {trend}% vs {expected_trend}%")
+
+    # Trend Strength is added when the dataset is assembled, so check the saved records
+    records = load_sp500_data()
+    by_symbol = {r.get('Symbol'): r for r in records}
+    stored = by_symbol.get('AAPL')
+    if not stored:
+        raise AssertionError("AAPL missing from the saved dataset.")
+    print(f"  AAPL Trend Strength: {stored['Trend Strength']}%")
+
+    # Every saved record in one pass; None becomes NaN and is left out
+    ma50 = np.array([r.get('50D MA') for r in records], dtype=np.float64)
+    ma200 = np.array([r.get('200D MA') for r in records], dtype=np.float64)
+    trend = np.array([r.get('Trend Strength') for r in records], dtype=np.float64)
+    checked = np.isfinite(ma50) & np.isfinite(ma200) & np.isfinite(trend) & (ma200 != 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        expected_trend = np.round(((ma50 / ma200) - 1) * 100, 2)
+    bad = checked & ~(np.abs(trend - expected_trend) < 0.1)
+    if bad.any():
+        failing = [records[i].get('Symbol') for i in np.flatnonzero(bad)]
+        fail(f"Trend Strength mismatch for {len(failing)} stocks: {', '.join(failing[:10])}")
     else:
-        print(f"FAIL: Trend Strength mismatch: {trend}% vs {expected_trend}%")
+        print(f"SUCCESS: Trend Strength matches logic for {int(checked.sum())} stocks.")
+
+    print("\nTimings:")
+    for phase, ms in timings.items():
+        print(f"  {phase}: {ms:.1f} ms")
+    if PERF_BUDGET_MS:
+        over = {phase: ms for phase, ms in timings.items() if ms > float(PERF_BUDGET_MS)}
+        if over:
+            fail(f"Over the {PERF_BUDGET_MS} ms budget: {', '.join(over)}")
+
+    if failures:
+        raise AssertionError(f"{len(failures)} check(s) failed")
 
 if __name__ == "__main__":
-    test_backend()
+    try:
+        test_backend()
+    except AssertionError as e:
+        print(f"FAIL: {e}")
+        sys.exit(1)